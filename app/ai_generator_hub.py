@@ -298,7 +298,7 @@ def _get_service_exclusive_section(hub_key: str, hub_label: str, trade_name: str
         return {
             "title": f"Residential {trade_name.title()} Safety & Home Value Protection",
             "focus": "family safety, property value, home resale considerations",
-            "technical_terms": vocabulary[:5] + ["home safety", "property value", "resale impact"],
+            "technical_terms": list(vocabulary[:5]) + ["home safety", "property value", "resale impact"],
             "unique_aspects": [
                 "Impact on home resale value and buyer inspections",
                 "Family safety considerations and child-proofing",
@@ -310,7 +310,7 @@ def _get_service_exclusive_section(hub_key: str, hub_label: str, trade_name: str
         return {
             "title": f"Commercial {trade_name.title()} Load Planning & Compliance",
             "focus": "load calculations, uptime requirements, OSHA compliance",
-            "technical_terms": vocabulary[:5] + ["load capacity", "uptime", "OSHA compliance"],
+            "technical_terms": list(vocabulary[:5]) + ["load capacity", "uptime", "OSHA compliance"],
             "unique_aspects": [
                 "Load calculations for commercial equipment and future expansion",
                 "Minimizing business downtime during installation or repairs",
@@ -322,7 +322,7 @@ def _get_service_exclusive_section(hub_key: str, hub_label: str, trade_name: str
         return {
             "title": f"Emergency {trade_name.title()} Response & Safety Protocols",
             "focus": "rapid response, safety hazards, immediate stabilization",
-            "technical_terms": vocabulary[:5] + ["emergency response", "safety hazard", "immediate stabilization"],
+            "technical_terms": list(vocabulary[:5]) + ["emergency response", "safety hazard", "immediate stabilization"],
             "unique_aspects": [
                 "24/7 emergency response and dispatch protocols",
                 "Immediate safety hazard assessment and triage",
@@ -334,7 +334,7 @@ def _get_service_exclusive_section(hub_key: str, hub_label: str, trade_name: str
         return {
             "title": f"{hub_label} {trade_name.title()} Expertise & Standards",
             "focus": "professional standards, quality workmanship",
-            "technical_terms": vocabulary[:5] + ["professional standards", "quality workmanship"],
+            "technical_terms": list(vocabulary[:5]) + ["professional standards", "quality workmanship"],
             "unique_aspects": [
                 "Industry standards and best practices",
                 "Quality materials and workmanship",
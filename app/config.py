@@ -29,6 +29,9 @@ class Settings:
         # OpenAI configuration (optional for future AI features)
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         
+        # Rows per POST when inserting bulk job items
+        self.supabase_insert_batch_size = int(os.getenv("SUPABASE_INSERT_BATCH_SIZE", "1000"))
+        
         # Validate required environment variables
         if not self.supabase_url:
             raise ValueError("SUPABASE_URL environment variable is required")
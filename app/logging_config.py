@@ -0,0 +1,31 @@
+"""
+Logging setup for the API and worker entrypoints.
+Library modules only create named loggers; the process decides where records go.
+"""
+
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+def configure_logging(fmt: str) -> None:
+    """
+    Route root logger records to stderr through a listener thread, so writing
+    logs never blocks the event loop even when many errors are logged at once.
+    The level comes from LOG_LEVEL (default INFO). Calling it again is a no-op.
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(fmt))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(records, stream_handler)
+
+    root.addHandler(QueueHandler(records))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    listener.start()
+    atexit.register(listener.stop)
@@ -26,6 +26,7 @@ from app.models import (
 from app.supabase_client import supabase_client
 from app.ai_generator import ai_generator
 from app.config import settings
+from app.logging_config import configure_logging
 
 
 def _canonical_key(service: str, city: str, state: str, page_mode: str = '', hub_key: str = '') -> str:
@@ -58,6 +59,19 @@ app = FastAPI(
     version="3.0.0"
 )
 
+@app.on_event("startup")
+async def setup_logging():
+    """Send app loggers (e.g. app.supabase_client) to stderr at LOG_LEVEL."""
+    configure_logging("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+@app.on_event("shutdown")
+async def close_supabase_client():
+    """Write out queued usage logs and close the Supabase connection pools."""
+    supabase_client.flush_usage_logs()
+    await supabase_client.aclose()
+
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """
@@ -225,15 +239,12 @@ async def generate_page(request: GeneratePageRequest):
             "slug": page_content.slug
         }
         
-        usage_logged = supabase_client.log_usage(
+        supabase_client.log_usage(
             api_key_id=api_key_id,
             action="ai_page_generation_success",
             details=usage_details
         )
         
-        if not usage_logged:
-            print(f"Warning: Failed to log usage for api_key {api_key_id}")
-        
         return page_content
         
     except Exception as e:
@@ -262,6 +273,24 @@ async def create_bulk_job(request: BulkJobCreateRequest):
     if not request.items:
         print(f"[API /bulk-jobs POST] ERROR: No items provided in request")
         raise HTTPException(status_code=400, detail="No items provided")
+
+    # bulk_job_items is unique on (job_id, canonical_key); a repeated page would
+    # fail its insert batch, so reject it before the job is created
+    canonical_keys: list[str] = []
+    seen_keys: set[str] = set()
+    for idx, item in enumerate(request.items):
+        key = _canonical_key(
+            getattr(item, 'service', '') or '',
+            getattr(item, 'city', '') or '',
+            getattr(item, 'state', '') or '',
+            getattr(item, 'page_mode', 'service_city'),
+            getattr(item, 'hub_key', ''),
+        )
+        if key in seen_keys:
+            print(f"[API /bulk-jobs POST] ERROR: Duplicate item {idx}: {key}")
+            raise HTTPException(status_code=400, detail=f"Duplicate item at index {idx}: {key}")
+        seen_keys.add(key)
+        canonical_keys.append(key)
     print(f"[API /bulk-jobs POST] Creating bulk job with {len(request.items)} items")
 
     try:
@@ -304,7 +333,7 @@ async def create_bulk_job(request: BulkJobCreateRequest):
                 "phone": item.phone,
                 "email": item.email,
                 "address": item.address,
-                "canonical_key": _canonical_key(service, city, state, page_mode, hub_key),
+                "canonical_key": canonical_keys[idx],
                 "status": "pending",
                 "attempts": 0,
                 "page_mode": page_mode,
@@ -321,7 +350,7 @@ async def create_bulk_job(request: BulkJobCreateRequest):
     try:
         print(f"[API /bulk-jobs POST] Calling supabase_client.insert_bulk_job_items")
         print(f"[API /bulk-jobs POST] DEBUG items_payload sample: {items_payload[0] if items_payload else 'empty'}")
-        ok = supabase_client.insert_bulk_job_items(items=items_payload)
+        ok = await supabase_client.insert_bulk_job_items_async(items=items_payload)
         print(f"[API /bulk-jobs POST] Successfully inserted items")
     except Exception as e:
         supabase_client.cancel_bulk_job(job_id=job_id)
@@ -343,14 +372,16 @@ async def get_bulk_job_status(job_id: str, license_key: str = Query(...)):
     if job.get("license_key") != license_key:
         raise HTTPException(status_code=403, detail="Job does not belong to license")
 
-    counters = supabase_client.recompute_bulk_job_counters(job_id=job_id) or {}
+    # Counters are kept current by the bulk_job_items trigger, so polling reads
+    # the job row. It is cached for 5s, so progress can lag by that much;
+    # /admin/bulk-jobs/{job_id}/recompute repairs drifted counters
     return BulkJobStatusResponse(
         job_id=str(job_id),
-        status=str(counters.get("status") or job.get("status") or ""),
-        total_items=int(counters.get("total_items") or job.get("total_items") or 0),
-        processed=int(counters.get("processed") or job.get("processed") or 0),
-        completed=int(counters.get("completed") or job.get("completed") or 0),
-        failed=int(counters.get("failed") or job.get("failed") or 0),
+        status=str(job.get("status") or ""),
+        total_items=int(job.get("total_items") or 0),
+        processed=int(job.get("processed") or 0),
+        completed=int(job.get("completed") or 0),
+        failed=int(job.get("failed") or 0),
     )
 
 
@@ -410,8 +441,7 @@ async def ack_bulk_job_results(job_id: str, request: BulkJobAckRequest):
         raise HTTPException(status_code=404, detail="Job not found")
     if job.get("license_key") != request.license_key:
         raise HTTPException(status_code=403, detail="Job does not belong to license")
-    imported = supabase_client.mark_bulk_items_imported(job_id=job_id, item_ids=request.imported_item_ids)
-    supabase_client.recompute_bulk_job_counters(job_id=job_id)
+    imported = await supabase_client.mark_bulk_items_imported_async(job_id=job_id, item_ids=request.imported_item_ids)
     return BulkJobAckResponse(job_id=str(job_id), imported_count=int(imported))
 
 
@@ -601,6 +631,8 @@ async def reset_monthly_periods(secret: str = Query(...)):
         )
         
         if response.status_code == 200 or response.status_code == 204:
+            # Cached license lookups carry current_period_start
+            supabase_client.invalidate_license()
             print(f"[ADMIN] Monthly periods reset successfully")
             return {
                 "status": "success",
@@ -618,3 +650,35 @@ async def reset_monthly_periods(secret: str = Query(...)):
     except Exception as e:
         print(f"[ADMIN] Error resetting periods: {e}")
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.post("/admin/bulk-jobs/{job_id}/recompute")
+async def recompute_bulk_job(job_id: str, secret: str = Query(...)):
+    """
+    Admin endpoint to rebuild a bulk job's counters and status from its items.
+    Only needed to repair a job whose trigger-maintained counters have drifted.
+    
+    Args:
+        job_id: Bulk job to recompute
+        secret: Admin secret for authentication
+        
+    Returns:
+        The recomputed job row
+        
+    Raises:
+        HTTPException: 403 if secret is invalid, 500 if recompute fails
+    """
+    import os
+    
+    admin_secret = os.getenv("ADMIN_SECRET")
+    if not admin_secret or secret != admin_secret:
+        print(f"[ADMIN] Invalid secret attempt")
+        raise HTTPException(status_code=403, detail="Invalid admin secret")
+    
+    job = supabase_client.recompute_bulk_job_counters(job_id=job_id)
+    if not job:
+        print(f"[ADMIN] Failed to recompute bulk job {job_id}")
+        raise HTTPException(status_code=500, detail="Failed to recompute bulk job")
+    
+    print(f"[ADMIN] Recomputed bulk job {job_id}")
+    return job
@@ -3,18 +3,154 @@ Supabase client configuration and database operations.
 Centralizes all database interactions for the application.
 """
 
+import asyncio
+import atexit
+import logging
+import queue
+import random
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from itertools import islice
+
 import httpx
+import orjson
+from cachetools import TTLCache
+
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Connection pool shared shape for the sync and async clients. Idle keep-alive
+# connections are held for a minute so bursty workers don't re-handshake.
+_POOL_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+
+# Transient gateway/throttling responses are retried with jittered backoff.
+# 502/504 may mean PostgREST already ran the statement, so those are only
+# retried for methods that are safe to repeat; POSTs (RPCs) retry on 429/503.
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+_RETRY_STATUSES_POST = frozenset({429, 503})
+_MAX_RETRIES = 3
+_MAX_RETRY_AFTER = 10.0
+# The sync client runs inside FastAPI's event loop, so its retries may only
+# sleep this long in total; a longer Retry-After returns the response as is.
+_MAX_SYNC_RETRY_SECONDS = 0.5
+
+# Writes whose callers only need the status code skip the echoed row
+_RETURN_MINIMAL_HEADERS = {"Prefer": "return=minimal"}
+
+
+# Queued usage logs are written once this many pile up, or after this long
+USAGE_LOG_BATCH_SIZE = 50
+USAGE_LOG_FLUSH_SECONDS = 0.2
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float | None:
+    """Seconds to wait before retrying, or None if the response is final."""
+    if attempt >= _MAX_RETRIES:
+        return None
+    statuses = _RETRY_STATUSES_POST if response.request.method == "POST" else _RETRY_STATUSES
+    if response.status_code not in statuses:
+        return None
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), _MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return 0.1 * 2 ** attempt + random.uniform(0, 0.1)
+
+
+def _flatten_license(api_key_data: dict) -> dict:
+    """Copy the embedded subscription's limits onto an api_keys row."""
+    subscription = api_key_data.get('subscription')
+    
+    # Flatten subscription data into api_key_data for backward compatibility
+    if subscription:
+        api_key_data['page_limit'] = subscription.get('page_limit', 500)
+        api_key_data['monthly_generation_limit'] = subscription.get('monthly_generation_limit', 500)
+        api_key_data['current_period_start'] = subscription.get('current_period_start')
+        api_key_data['subscription_status'] = subscription.get('status')
+    return api_key_data
+
+
+def _hydrate_claimed_items(rows: list) -> list[dict]:
+    """Flatten the license attached to each row from claim_bulk_items_hydrated."""
+    for row in rows:
+        if row.get("license"):
+            _flatten_license(row["license"])
+    return rows
+
+
+def evaluate_generation_quota(quota: dict | None) -> tuple[bool, str, dict]:
+    """
+    Apply the dual page limits to a generation_quota result.
+    
+    Returns:
+        Tuple of (can_generate: bool, reason: str, stats: dict)
+    """
+    if not quota:
+        return False, "API key not found", {}
+    
+    if not quota.get("subscription"):
+        return False, "No active subscription", {}
+    
+    page_limit = int(quota["page_limit"])
+    monthly_limit = int(quota["monthly_limit"])
+    total_pages = int(quota["total_pages"])
+    period_pages = int(quota["period_pages"])
+    
+    stats = {
+        "total_pages": total_pages,
+        "page_limit": page_limit,
+        "pages_remaining_capacity": page_limit - total_pages,
+        "period_pages": period_pages,
+        "monthly_limit": monthly_limit,
+        "pages_remaining_this_month": monthly_limit - period_pages
+    }
+    
+    # Check both limits
+    if total_pages >= page_limit:
+        return False, f"Page limit reached ({total_pages}/{page_limit}). Delete pages to generate more.", stats
+    
+    if period_pages >= monthly_limit:
+        return False, f"Monthly generation limit reached ({period_pages}/{monthly_limit}). Resets next month.", stats
+    
+    return True, "Can generate", stats
+
+
+def _item_result_payload(status: str, result_json: dict | None, error: str | None, attempts: int | None) -> dict:
+    """PATCH body for one bulk item; unset fields are left as they are."""
+    payload: dict = {"status": status}
+    if result_json is not None:
+        payload["result_json"] = result_json
+    if error is not None:
+        payload["error"] = error
+    if attempts is not None:
+        payload["attempts"] = attempts
+    return payload
 
-def _chunk_list(values: list, chunk_size: int) -> list[list]:
-    out: list[list] = []
-    for i in range(0, len(values), chunk_size):
-        out.append(values[i : i + chunk_size])
-    return out
+
+def _chunk_iter(values: Iterable, chunk_size: int) -> Iterator[list]:
+    it = iter(values)
+    while chunk := list(islice(it, chunk_size)):
+        yield chunk
 
 class SupabaseClient:
     """HTTP-based Supabase client for reliable database operations."""
+
+    __slots__ = (
+        "url",
+        "headers",
+        "_license_cache",
+        "_job_cache",
+        "_cache_lock",
+        "_client",
+        "_aclient",
+        "_log_queue",
+        "_log_thread",
+    )
     
     def __init__(self):
         """Initialize Supabase client with configuration from settings."""
@@ -26,14 +162,69 @@ class SupabaseClient:
             "Authorization": f"Bearer {settings.supabase_secret_key}",
             "Content-Type": "application/json"
         }
+        # License rows change rarely, so auth checks are served from memory for a
+        # short window. Job rows get a much shorter TTL: it only needs to absorb
+        # the burst of lookups a single recompute/poll cycle makes.
+        self._license_cache = TTLCache(maxsize=2048, ttl=60)
+        self._job_cache = TTLCache(maxsize=1024, ttl=5)
+        self._cache_lock = threading.Lock()
+        # One pooled client per process (plus an async twin for fan-out calls) so
+        # requests reuse open TCP/TLS connections instead of handshaking each time.
+        # The transports also retry failed connection attempts.
+        self._client = httpx.Client(
+            base_url=self.url,
+            headers=self.headers,
+            transport=httpx.HTTPTransport(http2=True, limits=_POOL_LIMITS, retries=3),
+            timeout=15.0,
+        )
+        self._aclient = httpx.AsyncClient(
+            base_url=self.url,
+            headers=self.headers,
+            transport=httpx.AsyncHTTPTransport(http2=True, limits=_POOL_LIMITS, retries=3),
+            timeout=15.0,
+        )
+        # Usage logs queued by log_usage() and written by a daemon thread. atexit
+        # runs handlers last-in-first-out, so queued logs flush before close().
+        self._log_queue: queue.Queue = queue.Queue()
+        self._log_thread = threading.Thread(target=self._usage_log_writer, name="usage-log-writer", daemon=True)
+        self._log_thread.start()
+        atexit.register(self.close)
+        atexit.register(self.flush_usage_logs)
+
+    def close(self) -> None:
+        """Close the pooled sync client. Registered with atexit."""
+        self._client.close()
+
+    async def aclose(self) -> None:
+        """Close both pooled clients. Call from async shutdown hooks."""
+        self._client.close()
+        await self._aclient.aclose()
 
     def _request(self, method: str, path: str, *, params: dict | None = None, json: dict | list | None = None, extra_headers: dict | None = None, timeout: int = 15) -> httpx.Response:
-        url = f"{self.url}{path}"
-        headers = dict(self.headers)
-        if extra_headers:
-            headers.update(extra_headers)
-        with httpx.Client() as client:
-            return client.request(method, url, params=params, headers=headers, json=json, timeout=timeout)
+        content = orjson.dumps(json) if json is not None else None
+        attempt = 0
+        slept = 0.0
+        while True:
+            response = self._client.request(method, path, params=params, headers=extra_headers, content=content, timeout=timeout)
+            delay = _retry_delay(response, attempt)
+            if delay is None or slept + delay > _MAX_SYNC_RETRY_SECONDS:
+                return response
+            logger.warning("Supabase %s %s returned %s, retrying in %.2fs", method, path, response.status_code, delay)
+            time.sleep(delay)
+            slept += delay
+            attempt += 1
+
+    async def _arequest(self, method: str, path: str, *, params: dict | None = None, json: dict | list | None = None, extra_headers: dict | None = None, timeout: int = 15) -> httpx.Response:
+        content = orjson.dumps(json) if json is not None else None
+        attempt = 0
+        while True:
+            response = await self._aclient.request(method, path, params=params, headers=extra_headers, content=content, timeout=timeout)
+            delay = _retry_delay(response, attempt)
+            if delay is None:
+                return response
+            logger.warning("Supabase %s %s returned %s, retrying in %.2fs", method, path, response.status_code, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
     
     def get_license_by_key(self, license_key: str) -> dict | None:
         """
@@ -45,37 +236,48 @@ class SupabaseClient:
         Returns:
             Combined API key + subscription data as dict if found, None if not found
         """
+        with self._cache_lock:
+            cached = self._license_cache.get(license_key)
+        if cached is not None:
+            return cached
+
         try:
-            with httpx.Client() as client:
-                # Query api_keys and join with subscriptions to get limits
-                response = client.get(
-                    f"{self.url}/rest/v1/api_keys?key=eq.{license_key}&select=*,subscription:subscriptions(*)",
-                    headers=self.headers,
-                    timeout=10
-                )
+            # Query api_keys and join with subscriptions to get limits
+            response = self._request(
+                "GET",
+                "/rest/v1/api_keys",
+                params={"key": f"eq.{license_key}", "select": "*,subscription:subscriptions(*)"},
+                timeout=10
+            )
+            
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if data and len(data) > 0:
+                    api_key_data = _flatten_license(data[0])
+                    with self._cache_lock:
+                        self._license_cache[license_key] = api_key_data
+                    return api_key_data
+                return None
+            else:
+                logger.error("HTTP Error %s querying API key: %s", response.status_code, response.text)
+                return None
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        api_key_data = data[0]
-                        subscription = api_key_data.get('subscription')
-                        
-                        # Flatten subscription data into api_key_data for backward compatibility
-                        if subscription:
-                            api_key_data['page_limit'] = subscription.get('page_limit', 500)
-                            api_key_data['monthly_generation_limit'] = subscription.get('monthly_generation_limit', 500)
-                            api_key_data['current_period_start'] = subscription.get('current_period_start')
-                            api_key_data['subscription_status'] = subscription.get('status')
-                        
-                        return api_key_data
-                    return None
-                else:
-                    print(f"HTTP Error {response.status_code}: {response.text}")
-                    return None
-                    
-        except Exception as e:
-            print(f"Error querying API key: {e}")
+        except Exception:
+            logger.exception("Error querying API key")
             return None
+
+    def invalidate_license(self, license_key: str | None = None) -> None:
+        """Drop a cached license lookup, or the whole license cache when no key is given."""
+        with self._cache_lock:
+            if license_key is None:
+                self._license_cache.clear()
+            else:
+                self._license_cache.pop(license_key, None)
+
+    def invalidate_bulk_job(self, job_id: str) -> None:
+        """Drop a cached bulk job row after writing to it."""
+        with self._cache_lock:
+            self._job_cache.pop(str(job_id), None)
     
     def check_can_generate(self, api_key_id: str) -> tuple[bool, str, dict]:
         """
@@ -90,151 +292,141 @@ class SupabaseClient:
             Tuple of (can_generate: bool, reason: str, stats: dict)
         """
         try:
-            # Get API key and subscription data
+            # Limits and page counts across every API key on the subscription,
+            # computed server-side in one call
             response = self._request(
-                "GET",
-                f"/rest/v1/api_keys?id=eq.{api_key_id}&select=*,subscription:subscriptions(*)",
+                "POST",
+                "/rest/v1/rpc/generation_quota",
+                json={"api_key_id": api_key_id},
                 timeout=10
             )
             if response.status_code != 200:
                 return False, "API key not found", {}
             
-            api_keys = response.json()
-            if not api_keys:
-                return False, "API key not found", {}
-            
-            api_key_data = api_keys[0]
-            subscription = api_key_data.get('subscription')
-            
-            if not subscription:
-                return False, "No active subscription", {}
-            
-            page_limit = int(subscription.get("page_limit", 500))
-            monthly_limit = int(subscription.get("monthly_generation_limit", 500))
-            period_start = subscription.get("current_period_start")
-            subscription_id = subscription.get("id")
-            
-            # Count total pages generated across ALL API keys in this subscription
-            # Get all api_keys for this subscription
-            sub_keys_response = self._request(
-                "GET",
-                f"/rest/v1/api_keys?subscription_id=eq.{subscription_id}&select=id",
-                timeout=10
-            )
-            api_key_ids = [k['id'] for k in sub_keys_response.json()] if sub_keys_response.status_code == 200 else [api_key_id]
-            
-            # Count usage across all API keys in this subscription
-            total_pages = 0
-            period_pages = 0
-            
-            for key_id in api_key_ids:
-                # Count total pages for this API key
-                total_response = self._request(
-                    "GET",
-                    f"/rest/v1/usage_logs?api_key_id=eq.{key_id}&action=in.(ai_page_generation_success,bulk_item_generation_success)&select=id",
-                    timeout=10
-                )
-                total_pages += len(total_response.json()) if total_response.status_code == 200 else 0
-                
-                # Count pages this period for this API key
-                from urllib.parse import quote
-                encoded_period_start = quote(str(period_start))
-                period_response = self._request(
-                    "GET",
-                    f"/rest/v1/usage_logs?api_key_id=eq.{key_id}&action=in.(ai_page_generation_success,bulk_item_generation_success)&created_at=gte.{encoded_period_start}&select=id",
-                    timeout=10
-                )
-                period_pages += len(period_response.json()) if period_response.status_code == 200 else 0
-            
-            stats = {
-                "total_pages": total_pages,
-                "page_limit": page_limit,
-                "pages_remaining_capacity": page_limit - total_pages,
-                "period_pages": period_pages,
-                "monthly_limit": monthly_limit,
-                "pages_remaining_this_month": monthly_limit - period_pages
-            }
-            
-            # Check both limits
-            if total_pages >= page_limit:
-                return False, f"Page limit reached ({total_pages}/{page_limit}). Delete pages to generate more.", stats
-            
-            if period_pages >= monthly_limit:
-                return False, f"Monthly generation limit reached ({period_pages}/{monthly_limit}). Resets next month.", stats
-            
-            return True, "Can generate", stats
+            return evaluate_generation_quota(orjson.loads(response.content))
             
         except Exception as e:
-            print(f"Error checking generation limits: {e}")
+            logger.exception("Error checking generation limits")
             return False, f"Error: {str(e)}", {}
     
-    # DEPRECATED: Keep for backward compatibility but no longer used
-    def deduct_credit(self, license_id: str) -> bool:
-        """DEPRECATED: Credits are now tracked via usage_logs, not deducted from balance."""
-        # No-op: we now track via usage_logs instead of deducting
-        return True
-
-    def deduct_credit_safe(self, license_id: str, current_credits: int) -> bool:
-        """DEPRECATED: Credits are now tracked via usage_logs, not deducted from balance."""
-        # No-op: we now track via usage_logs instead of deducting
-        return True
-    
-    def log_usage(self, api_key_id: str, action: str, details: dict = None) -> bool:
+    def log_usage(self, api_key_id: str, action: str, details: dict = None) -> None:
         """
         Log usage to the usage_logs table for tracking and analytics.
         Prevents duplicate logging for bulk items by checking canonical_key.
         
+        The entry is queued and written in batches by a background thread, so
+        the caller doesn't wait on the round-trip.
+        
         Args:
             api_key_id: The API key ID that performed the action
             action: The action performed (e.g., 'ai_page_generation_success')
             details: Optional additional details about the usage
-            
-        Returns:
-            True if logged successfully, False otherwise
+        
+        Write failures are logged by the writer thread, not reported here.
         """
+        self._log_queue.put_nowait({
+            "api_key_id": api_key_id,
+            "action": action,
+            "details": details or {}
+        })
+
+    def flush_usage_logs(self, timeout: float = 10.0) -> None:
+        """Block until queued usage logs are written (or timeout). Runs at exit."""
+        deadline = time.monotonic() + timeout
+        with self._log_queue.all_tasks_done:
+            while self._log_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Gave up flushing %s queued usage logs", self._log_queue.unfinished_tasks)
+                    return
+                self._log_queue.all_tasks_done.wait(remaining)
+
+    def _usage_log_writer(self) -> None:
+        # Collect up to USAGE_LOG_BATCH_SIZE entries, or whatever arrived within
+        # USAGE_LOG_FLUSH_SECONDS of the first one, and insert them in one POST.
+        while True:
+            batch = [self._log_queue.get()]
+            deadline = time.monotonic() + USAGE_LOG_FLUSH_SECONDS
+            while len(batch) < USAGE_LOG_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._log_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._insert_usage_logs(batch)
+            for _ in batch:
+                self._log_queue.task_done()
+
+    def _insert_usage_logs(self, entries: list[dict]) -> bool:
         try:
-            details = details or {}
-            
             # For bulk items, check if already logged to prevent duplicates
-            if action == "bulk_item_generation_success" and "canonical_key" in details:
-                canonical_key = details["canonical_key"]
-                job_id = details.get("job_id", "")
-                
-                # Check if this exact item was already logged
-                check_response = self._request(
-                    "GET",
-                    f"/rest/v1/usage_logs?api_key_id=eq.{api_key_id}&action=eq.{action}&details->>canonical_key=eq.{canonical_key}&details->>job_id=eq.{job_id}&select=id",
-                    timeout=5
-                )
-                
-                if check_response.status_code == 200:
-                    existing = check_response.json()
-                    if existing and len(existing) > 0:
-                        print(f"Skipping duplicate usage log for {canonical_key}")
-                        return True  # Already logged, return success
-            
-            # Log the usage
-            log_data = {
-                "api_key_id": api_key_id,
-                "action": action,
-                "details": details
-            }
-            
+            to_insert: list[dict] = []
+            for entry in entries:
+                details = entry["details"]
+                if entry["action"] == "bulk_item_generation_success" and "canonical_key" in details:
+                    canonical_key = details["canonical_key"]
+                    job_id = details.get("job_id", "")
+                    
+                    # Check if this exact item was already logged
+                    check_response = self._request(
+                        "GET",
+                        "/rest/v1/usage_logs",
+                        params={
+                            "api_key_id": f"eq.{entry['api_key_id']}",
+                            "action": f"eq.{entry['action']}",
+                            "details->>canonical_key": f"eq.{canonical_key}",
+                            "details->>job_id": f"eq.{job_id}",
+                            "select": "id",
+                        },
+                        timeout=5
+                    )
+                    
+                    if check_response.status_code == 200:
+                        existing = orjson.loads(check_response.content)
+                        if existing and len(existing) > 0:
+                            logger.info("Skipping duplicate usage log for %s", canonical_key)
+                            continue  # Already logged
+                to_insert.append(entry)
+
+            if not to_insert:
+                return True
+
+            # PostgREST inserts a JSON array as one multi-row INSERT
             response = self._request(
                 "POST",
                 "/rest/v1/usage_logs",
-                json=log_data,
+                json=to_insert,
+                extra_headers=_RETURN_MINIMAL_HEADERS,
                 timeout=10
             )
             
             if response.status_code == 201:
                 return True
-            else:
-                print(f"Error logging usage: {response.status_code} {response.text}")
+            if len(to_insert) == 1:
+                logger.error("Error logging usage: %s %s", response.status_code, response.text)
                 return False
+
+            # One bad row fails the whole INSERT, so write the rows one at a
+            # time and only lose the ones that are rejected on their own
+            logger.warning("Batch usage log insert returned %s, retrying %s rows individually", response.status_code, len(to_insert))
+            ok = True
+            for entry in to_insert:
+                response = self._request(
+                    "POST",
+                    "/rest/v1/usage_logs",
+                    json=entry,
+                    extra_headers=_RETURN_MINIMAL_HEADERS,
+                    timeout=10
+                )
+                if response.status_code != 201:
+                    logger.error("Error logging usage for api_key %s: %s %s", entry["api_key_id"], response.status_code, response.text)
+                    ok = False
+            return ok
                 
-        except Exception as e:
-            print(f"Error logging usage: {e}")
+        except Exception:
+            logger.exception("Error logging usage")
             return False
 
     def create_bulk_job(self, *, license_key: str, site_url: str | None, job_name: str | None, total_items: int) -> dict | None:
@@ -258,29 +450,62 @@ class SupabaseClient:
         )
         if resp.status_code != 201:
             raise RuntimeError(f"create_bulk_job HTTP {resp.status_code}: {resp.text}")
-        data = resp.json()
+        data = orjson.loads(resp.content)
         if isinstance(data, list) and data:
             return data[0]
         if isinstance(data, dict):
             return data
         return None
 
-    def insert_bulk_job_items(self, *, items: list[dict]) -> bool:
+    def insert_bulk_job_items(self, *, items: list[dict], batch_size: int | None = None) -> bool:
         if not items:
             return True
-        resp = self._request(
-            "POST",
-            "/rest/v1/bulk_job_items",
-            json=items,
-            extra_headers={"Prefer": "return=minimal"},
-            timeout=30,
-        )
-        if resp.status_code not in (201, 204):
-            raise RuntimeError(f"insert_bulk_job_items HTTP {resp.status_code}: {resp.text}")
+        for chunk in _chunk_iter(items, batch_size or settings.supabase_insert_batch_size):
+            resp = self._request(
+                "POST",
+                "/rest/v1/bulk_job_items",
+                json=chunk,
+                extra_headers=_RETURN_MINIMAL_HEADERS,
+                timeout=30,
+            )
+            if resp.status_code not in (201, 204):
+                raise RuntimeError(f"insert_bulk_job_items HTTP {resp.status_code}: {resp.text}")
+        return True
+
+    async def insert_bulk_job_items_async(self, *, items: list[dict], batch_size: int | None = None, concurrency: int = 8) -> bool:
+        """Insert items in fixed-size batches, with at most `concurrency` POSTs in flight."""
+        if not items:
+            return True
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _post(chunk: list[dict]) -> None:
+            async with sem:
+                resp = await self._arequest(
+                    "POST",
+                    "/rest/v1/bulk_job_items",
+                    json=chunk,
+                    extra_headers=_RETURN_MINIMAL_HEADERS,
+                    timeout=30,
+                )
+            if resp.status_code not in (201, 204):
+                raise RuntimeError(f"insert_bulk_job_items HTTP {resp.status_code}: {resp.text}")
+
+        # The first failed batch cancels the rest, so nothing more is inserted
+        # into a job the caller is about to cancel
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for chunk in _chunk_iter(items, batch_size or settings.supabase_insert_batch_size):
+                    tg.create_task(_post(chunk))
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0] from None
         return True
 
     def get_bulk_job(self, job_id: str) -> dict | None:
         job_id = str(job_id)
+        with self._cache_lock:
+            cached = self._job_cache.get(job_id)
+        if cached is not None:
+            return cached
         try:
             resp = self._request(
                 "GET",
@@ -290,8 +515,10 @@ class SupabaseClient:
             )
             if resp.status_code != 200:
                 return None
-            data = resp.json()
+            data = orjson.loads(resp.content)
             if isinstance(data, list) and data:
+                with self._cache_lock:
+                    self._job_cache[job_id] = data[0]
                 return data[0]
             return None
         except Exception:
@@ -304,186 +531,164 @@ class SupabaseClient:
                 "/rest/v1/bulk_jobs",
                 params={"id": f"eq.{job_id}"},
                 json={"status": "canceled"},
+                extra_headers=_RETURN_MINIMAL_HEADERS,
                 timeout=10,
             )
+            self.invalidate_bulk_job(job_id)
             return resp.status_code == 204
         except Exception:
             return False
 
     def get_bulk_job_results(self, *, job_id: str, status: str = "completed", cursor_idx: int | None = None, limit: int = 20) -> list[dict]:
-        # Fetch completed/failed items that haven't been imported yet
-        # For efficiency with large jobs, we use the cursor but ALSO check for any
-        # items before the cursor that might have completed out of order
-        
+        # Fetch completed/failed items the client hasn't received yet. The RPC
+        # stamps returned_to_client_at on the rows it hands out, so out-of-order
+        # completions are picked up without a separate "before cursor" query.
+        # cursor_idx is no longer needed to skip seen items; it is kept so the
+        # endpoint signature stays the same for older plugin versions.
         try:
-            # First, get items after the cursor (normal progression)
-            params_after: dict[str, str] = {
-                "job_id": f"eq.{job_id}",
-                "status": f"in.(completed,failed)",
-                "select": "id,idx,canonical_key,status,attempts,result_json,error,service,city,state,page_mode,hub_key,hub_label,hub_slug,city_slug,vertical,business_name,cta_text,service_area_label",
-                "order": "idx.asc",
-                "limit": str(int(limit)),
-            }
-            if cursor_idx is not None:
-                params_after["idx"] = f"gt.{cursor_idx}"
-            
-            resp = self._request("GET", "/rest/v1/bulk_job_items", params=params_after, timeout=15)
+            resp = self._request(
+                "POST",
+                "/rest/v1/rpc/take_bulk_job_results",
+                params={"select": "id,idx,canonical_key,status,attempts,result_json,error,service,city,state,page_mode,hub_key,hub_label,hub_slug,city_slug,vertical,business_name,cta_text,service_area_label"},
+                json={"job_id": job_id, "limit_n": int(limit)},
+                timeout=15,
+            )
             if resp.status_code != 200:
                 return []
-            items_after = resp.json() if resp.status_code == 200 else []
-            items_after = items_after if isinstance(items_after, list) else []
-            
-            # Also check for any completed items BEFORE the cursor (out-of-order completions)
-            # Only do this if we have a cursor and didn't get a full batch
-            items_before = []
-            if cursor_idx is not None and len(items_after) < limit:
-                params_before: dict[str, str] = {
-                    "job_id": f"eq.{job_id}",
-                    "status": f"in.(completed,failed)",
-                    "idx": f"lt.{cursor_idx}",
-                    "select": "id,idx,canonical_key,status,attempts,result_json,error,service,city,state,page_mode,hub_key,hub_label,hub_slug,city_slug,vertical,business_name,cta_text,service_area_label",
-                    "order": "idx.asc",
-                    "limit": str(int(limit - len(items_after))),
-                }
-                resp_before = self._request("GET", "/rest/v1/bulk_job_items", params=params_before, timeout=15)
-                if resp_before.status_code == 200:
-                    items_before = resp_before.json()
-                    items_before = items_before if isinstance(items_before, list) else []
-            
-            # Combine and sort by idx
-            all_items = items_before + items_after
-            all_items.sort(key=lambda x: x.get('idx', 0))
-            return all_items[:limit]
-            
+            items = orjson.loads(resp.content)
+            return items if isinstance(items, list) else []
         except Exception:
             return []
 
     def mark_bulk_items_imported(self, *, job_id: str, item_ids: list[str]) -> int:
         if not item_ids:
             return 0
-        imported = 0
         try:
-            for chunk in _chunk_list(item_ids, 100):
-                ids = ",".join(chunk)
-                # Only mark as imported if status is "completed"
-                # Items with status="failed" should remain failed - they weren't actually imported
-                resp = self._request(
-                    "PATCH",
-                    "/rest/v1/bulk_job_items",
-                    params={"job_id": f"eq.{job_id}", "id": f"in.({ids})", "status": "eq.completed"},
-                    json={"status": "imported"},
-                    timeout=20,
-                )
-                if resp.status_code == 204:
-                    imported += len(chunk)
-            return imported
-        except Exception as e:
-            print(f"Error acking imported items: {e}")
-            return imported
-
-    def list_pending_bulk_items(self, *, limit: int = 5) -> list[dict]:
-        params = {
-            "status": "eq.pending",  # FIXED: Only fetch truly pending items, not running ones
-            "select": "id,job_id,idx,service,city,state,company_name,phone,email,address,canonical_key,attempts,page_mode,hub_key,hub_label,hub_slug,city_slug,vertical,business_name,cta_text,service_area_label",
-            "order": "created_at.asc,idx.asc",
-            "limit": str(int(limit)),
-        }
+            resp = self._request(
+                "POST",
+                "/rest/v1/rpc/mark_bulk_items_imported",
+                json={"job_id": job_id, "ids": item_ids},
+                timeout=20,
+            )
+            if resp.status_code != 200:
+                logger.error("Error acking imported items for job %s: %s %s", job_id, resp.status_code, resp.text)
+                return 0
+            return int(orjson.loads(resp.content) or 0)
+        except Exception:
+            logger.exception("Error acking imported items for job %s", job_id)
+            return 0
+
+    async def mark_bulk_items_imported_async(self, *, job_id: str, item_ids: list[str]) -> int:
+        if not item_ids:
+            return 0
+        try:
+            resp = await self._arequest(
+                "POST",
+                "/rest/v1/rpc/mark_bulk_items_imported",
+                json={"job_id": job_id, "ids": item_ids},
+                timeout=20,
+            )
+            if resp.status_code != 200:
+                logger.error("Error acking imported items for job %s: %s %s", job_id, resp.status_code, resp.text)
+                return 0
+            return int(orjson.loads(resp.content) or 0)
+        except Exception:
+            logger.exception("Error acking imported items for job %s", job_id)
+            return 0
+
+    async def claim_bulk_items_async(self, *, limit: int = 5) -> list[dict]:
+        """
+        Atomically claim up to `limit` pending items; returned rows are already running.
+        
+        Each row carries its `job`, flattened `license` and `quota`
+        (generation_quota) so callers need no further lookups.
+        """
         try:
-            resp = self._request("GET", "/rest/v1/bulk_job_items", params=params, timeout=15)
+            resp = await self._arequest(
+                "POST",
+                "/rest/v1/rpc/claim_bulk_items_hydrated",
+                json={"limit_n": int(limit)},
+                timeout=15,
+            )
             if resp.status_code != 200:
                 return []
-            data = resp.json()
-            return data if isinstance(data, list) else []
+            data = orjson.loads(resp.content)
+            return _hydrate_claimed_items(data) if isinstance(data, list) else []
         except Exception:
             return []
 
-    def try_claim_bulk_item(self, *, item_id: str, attempts: int) -> bool:
+    def update_bulk_item_result(self, *, item_id: str, status: str, result_json: dict | None = None, error: str | None = None, attempts: int | None = None) -> bool:
+        payload = _item_result_payload(status, result_json, error, attempts)
         try:
             resp = self._request(
                 "PATCH",
                 "/rest/v1/bulk_job_items",
-                params={"id": f"eq.{item_id}", "status": "eq.pending"},
-                json={"status": "running", "attempts": int(attempts) + 1},
-                timeout=10,
+                params={"id": f"eq.{item_id}"},
+                json=payload,
+                extra_headers=_RETURN_MINIMAL_HEADERS,
+                timeout=30,
             )
             return resp.status_code == 204
         except Exception:
             return False
 
-    def update_bulk_item_result(self, *, item_id: str, status: str, result_json: dict | None = None, error: str | None = None) -> bool:
-        payload: dict = {"status": status}
-        if result_json is not None:
-            payload["result_json"] = result_json
-        if error is not None:
-            payload["error"] = error
+    async def update_bulk_item_result_async(self, *, item_id: str, status: str, result_json: dict | None = None, error: str | None = None, attempts: int | None = None) -> bool:
+        payload = _item_result_payload(status, result_json, error, attempts)
         try:
-            resp = self._request(
+            resp = await self._arequest(
                 "PATCH",
                 "/rest/v1/bulk_job_items",
                 params={"id": f"eq.{item_id}"},
                 json=payload,
+                extra_headers=_RETURN_MINIMAL_HEADERS,
                 timeout=30,
             )
             return resp.status_code == 204
         except Exception:
             return False
 
-    def recompute_bulk_job_counters(self, *, job_id: str) -> dict | None:
+    async def update_bulk_item_results_async(self, results: list[dict]) -> bool:
+        """
+        Apply many item results in one call.
+
+        Each entry has `id` and `status`, plus optional `result_json`,
+        `error` and `attempts`.
+        """
+        if not results:
+            return True
         try:
-            items_resp = self._request(
-                "GET",
-                "/rest/v1/bulk_job_items",
-                params={"job_id": f"eq.{job_id}", "select": "status"},
+            resp = await self._arequest(
+                "POST",
+                "/rest/v1/rpc/update_bulk_item_results",
+                json={"results": results},
                 timeout=30,
             )
-            if items_resp.status_code != 200:
-                return None
-            statuses = items_resp.json()
-            if not isinstance(statuses, list):
-                return None
+            if resp.status_code != 200:
+                logger.error("Error updating item results: %s %s", resp.status_code, resp.text)
+                return False
+            return True
+        except Exception:
+            logger.exception("Error updating item results")
+            return False
 
-            processed = 0
-            completed = 0
-            failed = 0
-            for row in statuses:
-                s = (row.get("status") or "").lower()
-                if s in ("completed", "failed", "imported"):
-                    processed += 1
-                if s in ("completed", "imported"):
-                    completed += 1
-                if s == "failed":
-                    failed += 1
-
-            job = self.get_bulk_job(job_id)
-            total_items = int(job.get("total_items", 0)) if job else 0
-            current_status = (job.get("status") if job else "")
-
-            new_status = None
-            if current_status not in ("canceled", "failed"):
-                if total_items > 0 and (completed + failed) >= total_items:
-                    new_status = "complete"
-                else:
-                    new_status = "running"
-
-            payload: dict = {"processed": processed, "completed": completed, "failed": failed}
-            if new_status:
-                payload["status"] = new_status
-
-            patch = self._request(
-                "PATCH",
-                "/rest/v1/bulk_jobs",
-                params={"id": f"eq.{job_id}"},
-                json=payload,
-                timeout=15,
+    def recompute_bulk_job_counters(self, *, job_id: str) -> dict | None:
+        try:
+            resp = self._request(
+                "POST",
+                "/rest/v1/rpc/recompute_bulk_job",
+                json={"job_id": job_id},
+                timeout=30,
             )
-            if patch.status_code != 204:
+            if resp.status_code != 200:
                 return None
-
-            payload["total_items"] = total_items
-            payload["status"] = new_status or current_status
-            return payload
-        except Exception as e:
-            print(f"Error recomputing bulk counters: {e}")
+            job = orjson.loads(resp.content)
+            if not isinstance(job, dict):
+                return None
+            with self._cache_lock:
+                self._job_cache[str(job_id)] = job
+            return job
+        except Exception:
+            logger.exception("Error recomputing bulk counters for job %s", job_id)
             return None
     
     def register_site(self, site_url: str, license_key: str, secret_key: str, 
@@ -505,7 +710,8 @@ class SupabaseClient:
             # Check if site already exists
             response = self._request(
                 "GET",
-                f"/rest/v1/sites?site_url=eq.{site_url}",
+                "/rest/v1/sites",
+                params={"site_url": f"eq.{site_url}"},
                 timeout=10
             )
             
@@ -515,24 +721,24 @@ class SupabaseClient:
                 "secret_key": secret_key,
                 "plugin_version": plugin_version,
                 "wordpress_version": wordpress_version,
-                "updated_at": "now()"
+                "updated_at": datetime.now(timezone.utc).isoformat()
             }
             
-            if response.status_code == 200 and response.json():
+            if response.status_code == 200 and orjson.loads(response.content):
                 # Update existing site
                 update_response = self._request(
                     "PATCH",
-                    f"/rest/v1/sites?site_url=eq.{site_url}",
+                    "/rest/v1/sites",
+                    params={"site_url": f"eq.{site_url}"},
                     json=site_data,
                     extra_headers={"Prefer": "return=representation"},
                     timeout=10
                 )
                 if update_response.status_code == 200:
-                    result = update_response.json()
+                    result = orjson.loads(update_response.content)
                     return result[0] if result else None
             else:
-                # Insert new site
-                site_data["registered_at"] = "now()"
+                # Insert new site (registered_at defaults to NOW())
                 insert_response = self._request(
                     "POST",
                     "/rest/v1/sites",
@@ -541,12 +747,12 @@ class SupabaseClient:
                     timeout=10
                 )
                 if insert_response.status_code == 201:
-                    result = insert_response.json()
+                    result = orjson.loads(insert_response.content)
                     return result[0] if result else None
             
             return None
-        except Exception as e:
-            print(f"Error registering site: {e}")
+        except Exception:
+            logger.exception("Error registering site %s", site_url)
             return None
     
     def get_sites_by_license_key(self, license_key: str) -> list[dict]:
@@ -562,14 +768,15 @@ class SupabaseClient:
         try:
             response = self._request(
                 "GET",
-                f"/rest/v1/sites?license_key=eq.{license_key}&status=eq.active",
+                "/rest/v1/sites",
+                params={"license_key": f"eq.{license_key}", "status": "eq.active"},
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return orjson.loads(response.content)
             return []
-        except Exception as e:
-            print(f"Error getting sites by license key: {e}")
+        except Exception:
+            logger.exception("Error getting sites by license key")
             return []
     
     def update_subscription_by_stripe_id(self, stripe_subscription_id: str, status: str, 
@@ -590,32 +797,34 @@ class SupabaseClient:
         try:
             update_data = {
                 "status": status,
-                "updated_at": "now()"
+                "updated_at": datetime.now(timezone.utc).isoformat()
             }
             
             if current_period_start:
-                from datetime import datetime
                 update_data["current_period_start"] = datetime.fromtimestamp(current_period_start).isoformat()
             
             if current_period_end:
-                from datetime import datetime
                 update_data["current_period_end"] = datetime.fromtimestamp(current_period_end).isoformat()
             
             response = self._request(
                 "PATCH",
-                f"/rest/v1/subscriptions?stripe_subscription_id=eq.{stripe_subscription_id}",
+                "/rest/v1/subscriptions",
+                params={"stripe_subscription_id": f"eq.{stripe_subscription_id}"},
                 json=update_data,
                 extra_headers={"Prefer": "return=representation"},
                 timeout=10
             )
             
+            # Cached license lookups carry flattened subscription fields
+            self.invalidate_license()
+            
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 return result[0] if result else None
             
             return None
-        except Exception as e:
-            print(f"Error updating subscription by Stripe ID: {e}")
+        except Exception:
+            logger.exception("Error updating subscription by Stripe ID %s", stripe_subscription_id)
             return None
     
     def get_api_keys_by_subscription_id(self, subscription_id: str) -> list[dict]:
@@ -631,14 +840,15 @@ class SupabaseClient:
         try:
             response = self._request(
                 "GET",
-                f"/rest/v1/api_keys?subscription_id=eq.{subscription_id}&status=eq.active",
+                "/rest/v1/api_keys",
+                params={"subscription_id": f"eq.{subscription_id}", "status": "eq.active"},
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return orjson.loads(response.content)
             return []
-        except Exception as e:
-            print(f"Error getting API keys by subscription ID: {e}")
+        except Exception:
+            logger.exception("Error getting API keys by subscription ID %s", subscription_id)
             return []
 
 # Global Supabase client instance
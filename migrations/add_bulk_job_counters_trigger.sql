@@ -0,0 +1,56 @@
+-- Migration: Keep bulk_jobs counters current with a trigger
+-- The worker used to call recompute_bulk_job after every batch, re-counting
+-- every item of the job by status. This statement-level trigger applies the
+-- status changes an UPDATE made to bulk_job_items as deltas, with one
+-- bulk_jobs update per touched job, so batch writes such as
+-- update_bulk_item_results and mark_bulk_items_imported stay O(changed rows).
+-- The status transition matches recompute_bulk_job, which is now only called
+-- by POST /admin/bulk-jobs/{job_id}/recompute to repair drifted counters.
+-- Column lists aren't allowed with transition tables, so rows are compared
+-- by status inside the function instead of using UPDATE OF status.
+
+CREATE OR REPLACE FUNCTION bump_bulk_job_counters()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE bulk_jobs j
+  SET
+    processed = j.processed + d.processed,
+    completed = j.completed + d.completed,
+    failed = j.failed + d.failed,
+    status = CASE
+      WHEN j.status IN ('canceled', 'failed') THEN j.status
+      WHEN j.total_items > 0
+        AND j.completed + d.completed + j.failed + d.failed >= j.total_items THEN 'complete'
+      ELSE 'running'
+    END
+  FROM (
+    SELECT
+      n.job_id,
+      sum((n.status IN ('completed', 'failed', 'imported'))::int
+        - (o.status IN ('completed', 'failed', 'imported'))::int) AS processed,
+      sum((n.status IN ('completed', 'imported'))::int
+        - (o.status IN ('completed', 'imported'))::int) AS completed,
+      sum((n.status = 'failed')::int - (o.status = 'failed')::int) AS failed
+    FROM new_items n
+    JOIN old_items o ON o.id = n.id
+    WHERE n.status IS DISTINCT FROM o.status
+    GROUP BY n.job_id
+  ) d
+  WHERE j.id = d.job_id
+    AND (d.processed <> 0 OR d.completed <> 0 OR d.failed <> 0);
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bulk_job_items_bump_counters ON bulk_job_items;
+CREATE TRIGGER bulk_job_items_bump_counters
+AFTER UPDATE ON bulk_job_items
+REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+FOR EACH STATEMENT EXECUTE FUNCTION bump_bulk_job_counters();
+
+-- Bring in-flight jobs up to date before the trigger takes over
+SELECT recompute_bulk_job(id)
+FROM bulk_jobs
+WHERE status NOT IN ('complete', 'canceled', 'failed');
@@ -0,0 +1,25 @@
+-- Migration: Add bulk_job_counts RPC
+-- recompute_bulk_job_counters used to download every item's status and tally
+-- them in Python. This function returns the tallies (plus the job's total and
+-- current status) in a single row so the work stays in Postgres.
+
+CREATE OR REPLACE FUNCTION bulk_job_counts(job_id uuid)
+RETURNS TABLE (
+  processed int,
+  completed int,
+  failed int,
+  total int,
+  current_status text
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    count(*) FILTER (WHERE i.status IN ('completed', 'failed', 'imported'))::int AS processed,
+    count(*) FILTER (WHERE i.status IN ('completed', 'imported'))::int AS completed,
+    count(*) FILTER (WHERE i.status = 'failed')::int AS failed,
+    (SELECT j.total_items FROM bulk_jobs j WHERE j.id = bulk_job_counts.job_id) AS total,
+    (SELECT j.status FROM bulk_jobs j WHERE j.id = bulk_job_counts.job_id) AS current_status
+  FROM bulk_job_items i
+  WHERE i.job_id = bulk_job_counts.job_id;
+$$;
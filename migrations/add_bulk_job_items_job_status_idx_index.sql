@@ -0,0 +1,8 @@
+-- Migration: Composite index for per-job status lookups on bulk_job_items
+-- take_bulk_job_results looks up a job's completed/failed items in idx order
+-- (including completed items due for redelivery), and bulk_job_counts tallies
+-- a job's items by status. Both only had the single-column job_id index to
+-- work with, so every poll re-read all of the job's rows.
+
+CREATE INDEX IF NOT EXISTS bulk_job_items_job_status_idx_idx
+ON bulk_job_items (job_id, status, idx);
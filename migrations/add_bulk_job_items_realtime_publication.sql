@@ -0,0 +1,15 @@
+-- Migration: Publish bulk_job_items changes to Supabase Realtime
+-- The worker subscribes to pending bulk_job_items rows and only claims work
+-- when one arrives, instead of polling claim_bulk_items every few seconds.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_publication_tables
+    WHERE pubname = 'supabase_realtime'
+      AND schemaname = 'public'
+      AND tablename = 'bulk_job_items'
+  ) THEN
+    ALTER PUBLICATION supabase_realtime ADD TABLE bulk_job_items;
+  END IF;
+END $$;
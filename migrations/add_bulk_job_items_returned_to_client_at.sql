@@ -0,0 +1,44 @@
+-- Migration: Track which bulk job results have been handed to the client
+-- get_bulk_job_results used the client's cursor to work out what it had
+-- already seen, which needed a second "before cursor" query for items that
+-- finished out of order. Stamping returned_to_client_at lets a single indexed
+-- query pick up exactly the results the client hasn't received yet.
+
+ALTER TABLE bulk_job_items
+ADD COLUMN IF NOT EXISTS returned_to_client_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS bulk_job_items_unreturned_idx
+ON bulk_job_items (job_id, idx)
+WHERE returned_to_client_at IS NULL AND status IN ('completed', 'failed');
+
+-- Selects the next batch of results for a job, stamps them as returned and
+-- hands them back ordered by idx, all in one statement.
+-- Completed items the client never acked (still 'completed' rather than
+-- 'imported') are handed out again after 5 minutes so a dropped poll
+-- response can't lose a generated page.
+CREATE OR REPLACE FUNCTION take_bulk_job_results(job_id uuid, limit_n int)
+RETURNS SETOF bulk_job_items
+LANGUAGE sql
+AS $$
+  WITH picked AS (
+    SELECT i.id
+    FROM bulk_job_items i
+    WHERE i.job_id = take_bulk_job_results.job_id
+      AND i.status IN ('completed', 'failed')
+      AND (
+        i.returned_to_client_at IS NULL
+        OR (i.status = 'completed' AND i.returned_to_client_at < now() - interval '5 minutes')
+      )
+    ORDER BY i.idx
+    LIMIT limit_n
+    FOR UPDATE SKIP LOCKED
+  ),
+  stamped AS (
+    UPDATE bulk_job_items i
+    SET returned_to_client_at = now()
+    FROM picked
+    WHERE i.id = picked.id
+    RETURNING i.*
+  )
+  SELECT * FROM stamped ORDER BY idx;
+$$;
@@ -0,0 +1,22 @@
+-- Migration: Add claim_bulk_items RPC
+-- Workers used to list pending items and then PATCH each one to claim it,
+-- one round-trip per item, with replicas racing for the same rows.
+-- This claims up to limit_n pending items in one statement; SKIP LOCKED lets
+-- concurrent workers take disjoint batches instead of colliding.
+
+CREATE OR REPLACE FUNCTION claim_bulk_items(limit_n int)
+RETURNS SETOF bulk_job_items
+LANGUAGE sql
+AS $$
+  UPDATE bulk_job_items i
+  SET status = 'running', attempts = i.attempts + 1
+  WHERE i.id IN (
+    SELECT p.id
+    FROM bulk_job_items p
+    WHERE p.status = 'pending'
+    ORDER BY p.created_at, p.idx
+    LIMIT limit_n
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING i.*;
+$$;
@@ -0,0 +1,69 @@
+-- Migration: Add claim_bulk_items_hydrated RPC
+-- After claiming, the worker fetched each item's job, then the job's API key,
+-- then the key's generation quota: three more round-trips per item before any
+-- work started. This claims the same batch as claim_bulk_items and returns
+-- each item with its job, API key (with embedded subscription) and
+-- generation_quota attached, so a batch costs one round-trip.
+--
+-- Each item also carries `reusable_result`: the newest result_json for the
+-- same canonical_key under the same license key whose page inputs all match,
+-- so a re-run job reuses pages instead of regenerating them. Both 'completed'
+-- and 'imported' items count, since acking a result keeps its result_json.
+-- Pages embed the business's name and contact details, so results are never
+-- shared across licenses or inputs. The lookup uses
+-- bulk_job_items_canonical_key_idx.
+--
+-- Requires add_generation_quota_function.sql.
+
+CREATE OR REPLACE FUNCTION claim_bulk_items_hydrated(limit_n int)
+RETURNS SETOF jsonb
+LANGUAGE sql
+AS $$
+  WITH claimed AS (
+    UPDATE bulk_job_items i
+    SET status = 'running', attempts = i.attempts + 1
+    WHERE i.id IN (
+      SELECT p.id
+      FROM bulk_job_items p
+      WHERE p.status = 'pending'
+      ORDER BY p.created_at, p.idx
+      LIMIT limit_n
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING i.*
+  )
+  SELECT to_jsonb(c) || jsonb_build_object(
+    'job', to_jsonb(j),
+    'license', CASE
+      WHEN k.id IS NULL THEN NULL
+      ELSE to_jsonb(k) || jsonb_build_object('subscription', to_jsonb(s))
+    END,
+    'quota', CASE WHEN k.id IS NULL THEN NULL ELSE generation_quota(k.id) END,
+    'reusable_result', (
+      SELECT prev.result_json
+      FROM bulk_job_items prev
+      JOIN bulk_jobs pj ON pj.id = prev.job_id
+      WHERE prev.canonical_key = c.canonical_key
+        AND prev.id <> c.id
+        AND prev.status IN ('completed', 'imported')
+        AND prev.result_json IS NOT NULL
+        AND pj.license_key = j.license_key
+        AND (prev.page_mode, prev.service, prev.city, prev.state, prev.company_name,
+             prev.phone, prev.email, prev.address, prev.hub_key, prev.hub_label,
+             prev.hub_slug, prev.city_slug, prev.vertical, prev.business_name,
+             prev.cta_text, prev.service_area_label)
+          IS NOT DISTINCT FROM
+            (c.page_mode, c.service, c.city, c.state, c.company_name,
+             c.phone, c.email, c.address, c.hub_key, c.hub_label,
+             c.hub_slug, c.city_slug, c.vertical, c.business_name,
+             c.cta_text, c.service_area_label)
+      ORDER BY prev.updated_at DESC
+      LIMIT 1
+    )
+  )
+  FROM claimed c
+  LEFT JOIN bulk_jobs j ON j.id = c.job_id
+  LEFT JOIN api_keys k ON k.key = j.license_key
+  LEFT JOIN subscriptions s ON s.id = k.subscription_id
+  ORDER BY c.created_at, c.idx;
+$$;
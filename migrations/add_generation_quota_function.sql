@@ -0,0 +1,43 @@
+-- Migration: Add generation_quota RPC
+-- check_can_generate used to fetch the API key, then every key on the same
+-- subscription, then the id of every usage log for each key (twice) just to
+-- count them. This returns the limits and both counts in one round-trip.
+
+CREATE INDEX IF NOT EXISTS usage_logs_api_key_action_created_idx
+ON usage_logs (api_key_id, action, created_at);
+
+-- Returns NULL when the API key doesn't exist, {"subscription": false} when it
+-- has no subscription, otherwise the subscription's limits and page counts
+-- across all API keys on that subscription.
+CREATE OR REPLACE FUNCTION generation_quota(api_key_id uuid)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT CASE
+    WHEN s.id IS NULL THEN jsonb_build_object('subscription', false)
+    ELSE jsonb_build_object(
+      'subscription', true,
+      'page_limit', coalesce(s.page_limit, 500),
+      'monthly_limit', coalesce(s.monthly_generation_limit, 500),
+      'total_pages', (
+        SELECT count(*)
+        FROM usage_logs u
+        JOIN api_keys sk ON sk.id = u.api_key_id
+        WHERE sk.subscription_id = s.id
+          AND u.action IN ('ai_page_generation_success', 'bulk_item_generation_success')
+      ),
+      'period_pages', (
+        SELECT count(*)
+        FROM usage_logs u
+        JOIN api_keys sk ON sk.id = u.api_key_id
+        WHERE sk.subscription_id = s.id
+          AND u.action IN ('ai_page_generation_success', 'bulk_item_generation_success')
+          AND u.created_at >= s.current_period_start
+      )
+    )
+  END
+  FROM api_keys k
+  LEFT JOIN subscriptions s ON s.id = k.subscription_id
+  WHERE k.id = generation_quota.api_key_id;
+$$;
@@ -0,0 +1,20 @@
+-- Migration: Add mark_bulk_items_imported RPC
+-- Acking imported items used to PATCH with an id=in.(...) filter in the URL,
+-- chunked to keep the URL short. Passing the ids in the request body lets one
+-- call cover any number of items and report how many rows actually changed.
+
+CREATE OR REPLACE FUNCTION mark_bulk_items_imported(job_id uuid, ids uuid[])
+RETURNS int
+LANGUAGE sql
+AS $$
+  WITH updated AS (
+    -- Only completed items become imported; failed items stay failed
+    UPDATE bulk_job_items i
+    SET status = 'imported'
+    WHERE i.job_id = mark_bulk_items_imported.job_id
+      AND i.id = ANY(mark_bulk_items_imported.ids)
+      AND i.status = 'completed'
+    RETURNING 1
+  )
+  SELECT count(*)::int FROM updated;
+$$;
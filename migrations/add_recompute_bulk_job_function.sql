@@ -0,0 +1,24 @@
+-- Migration: Add recompute_bulk_job RPC
+-- Folds the counter recompute, the status transition and the bulk_jobs UPDATE
+-- into one statement so the API/worker make a single round-trip and no other
+-- writer can change the job status between the read and the write.
+-- Requires bulk_job_counts (add_bulk_job_counts_function.sql).
+
+CREATE OR REPLACE FUNCTION recompute_bulk_job(job_id uuid)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+  UPDATE bulk_jobs j
+  SET
+    processed = c.processed,
+    completed = c.completed,
+    failed = c.failed,
+    status = CASE
+      WHEN j.status IN ('canceled', 'failed') THEN j.status
+      WHEN j.total_items > 0 AND c.completed + c.failed >= j.total_items THEN 'complete'
+      ELSE 'running'
+    END
+  FROM bulk_job_counts(recompute_bulk_job.job_id) c
+  WHERE j.id = recompute_bulk_job.job_id
+  RETURNING to_jsonb(j.*);
+$$;
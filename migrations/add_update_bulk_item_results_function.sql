@@ -0,0 +1,25 @@
+-- Migration: Add update_bulk_item_results RPC
+-- The worker used to PATCH each generated item twice (result, then status) as
+-- its own round-trip. This applies a whole batch of item results in one
+-- statement. Like the per-item PATCH, result_json and error are only
+-- overwritten when the entry provides them. attempts is likewise optional; the
+-- worker sets it when handing an interrupted item back to 'pending' so the
+-- claim that was cut short doesn't count against the item.
+
+CREATE OR REPLACE FUNCTION update_bulk_item_results(results jsonb)
+RETURNS int
+LANGUAGE sql
+AS $$
+  WITH updated AS (
+    UPDATE bulk_job_items i
+    SET status = r.status,
+        result_json = coalesce(r.result_json, i.result_json),
+        error = coalesce(r.error, i.error),
+        attempts = coalesce(r.attempts, i.attempts)
+    FROM jsonb_to_recordset(update_bulk_item_results.results)
+      AS r(id uuid, status text, result_json jsonb, error text, attempts int)
+    WHERE i.id = r.id
+    RETURNING 1
+  )
+  SELECT count(*)::int FROM updated;
+$$;
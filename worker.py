@@ -1,145 +1,218 @@
-import random
+import atexit
+import logging
 import time
 import os
 import sys
-import subprocess
+import resource
+import signal
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from app.supabase_client import supabase_client
+from threading import active_count
+from realtime import AsyncRealtimeClient
+from app.config import settings
+from app.logging_config import configure_logging
+from app.supabase_client import evaluate_generation_quota, supabase_client
 from app.ai_generator import ai_generator
 from app.models import PageData
 
 
 MAX_ATTEMPTS = 3
 BATCH_LIMIT = 5
-CONCURRENT_WORKERS = 3  # Process 3 items simultaneously
-IDLE_SLEEP_SECONDS = (2, 5)
+CONCURRENT_WORKERS = int(os.getenv("SEOGEN_WORKERS", "3"))  # Items generated simultaneously
+# Idle wait between claim attempts grows by IDLE_WAIT_BACKOFF after each empty
+# claim, from the minimum up to the maximum, and resets once work turns up.
+# A Realtime notification cuts the wait short.
+IDLE_WAIT_MIN_SECONDS = 2.0
+IDLE_WAIT_MAX_SECONDS = 60.0
+IDLE_WAIT_BACKOFF = 1.5
+# Backoff between Realtime re-subscribe attempts after the socket drops
+REALTIME_RETRY_MIN_SECONDS = 1.0
+REALTIME_RETRY_MAX_SECONDS = 60.0
+# How often completed results are written
+RESULT_FLUSH_SECONDS = 1.0
+
+# Item columns copied onto PageData as plain strings
+_PAGE_DATA_STR_FIELDS = (
+    "service",
+    "city",
+    "state",
+    "company_name",
+    "phone",
+    "email",
+    "address",
+    "hub_key",
+    "hub_label",
+    "hub_slug",
+    "city_slug",
+    "vertical",
+    "business_name",
+    "service_area_label",
+)
+
+# Shared thread pool for CPU-intensive AI generation, reused by every main_async run
+_EXECUTOR = ThreadPoolExecutor(max_workers=CONCURRENT_WORKERS, thread_name_prefix="ai-gen")
+# Interrupted items are handed back to 'pending' on shutdown, so exit doesn't
+# wait for generations whose results would be discarded
+atexit.register(_EXECUTOR.shutdown, wait=False, cancel_futures=True)
 
 # Get replica ID for logging
 REPLICA_ID = os.getenv("RAILWAY_REPLICA_ID", "unknown")
 
-def _log(msg: str) -> None:
-    print(f"[SEOgen Worker][Replica:{REPLICA_ID}] {msg}")
+logger = logging.getLogger("seogen.worker")
 
 
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    """Simple health check endpoint for Railway."""
-    def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(b'{"status":"ok"}')
-        else:
-            self.send_response(404)
-            self.end_headers()
-    
-    def log_message(self, format, *args):
-        # Suppress HTTP server logs
+_HEALTH_OK = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 15\r\n"
+    b"Connection: close\r\n\r\n"
+    b'{"status":"ok"}'
+)
+_HEALTH_NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+
+async def _handle_health_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer GET /health for Railway; anything else gets a 404."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Drain the headers; the response doesn't depend on them
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        parts = request_line.split()
+        ok = len(parts) >= 2 and parts[0] == b"GET" and parts[1] == b"/health"
+        writer.write(_HEALTH_OK if ok else _HEALTH_NOT_FOUND)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
         pass
+    finally:
+        writer.close()
 
 
-def start_health_server():
-    """Start health check server in background thread."""
+async def start_health_server() -> asyncio.AbstractServer:
+    """Serve the health check on the worker's event loop."""
     port = int(os.getenv('PORT', '8080'))
-    server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
-    _log(f"Health check server starting on port {port}")
-    server.serve_forever()
+    server = await asyncio.start_server(_handle_health_request, '0.0.0.0', port)
+    logger.info("Health check server starting on port %s", port)
+    return server
+
 
+async def _listen_for_pending_items(wake: asyncio.Event) -> None:
+    """
+    Set `wake` whenever a bulk_job_items row becomes pending.
+
+    Subscribes to Supabase Realtime postgres_changes and re-subscribes with
+    backoff whenever the socket drops. Runs until cancelled.
+    """
+    def _on_change(payload) -> None:
+        wake.set()
+
+    retry_wait = REALTIME_RETRY_MIN_SECONDS
+    while True:
+        client = AsyncRealtimeClient(f"{settings.supabase_url}/realtime/v1", settings.supabase_secret_key)
+        listen_task = None
+        try:
+            await client.connect()
+            listen_task = asyncio.create_task(client.listen())
+            channel = client.channel("bulk_job_items_pending")
+            await channel.on_postgres_changes(
+                "*",
+                schema="public",
+                table="bulk_job_items",
+                filter="status=eq.pending",
+                callback=_on_change,
+            ).subscribe()
+            logger.info("subscribed to pending bulk_job_items")
+            retry_wait = REALTIME_RETRY_MIN_SECONDS
+            await listen_task
+            logger.warning("realtime connection closed, resubscribing")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("realtime subscription failed err=%s", e)
+        finally:
+            if listen_task is not None and not listen_task.done():
+                listen_task.cancel()
+            try:
+                await client.close()
+            except Exception:
+                pass
 
-async def _process_item_async(item: dict, executor: ThreadPoolExecutor) -> None:
+        # Rows may have turned pending while disconnected, so claim once now
+        wake.set()
+        await asyncio.sleep(retry_wait)
+        retry_wait = min(retry_wait * 2, REALTIME_RETRY_MAX_SECONDS)
+
+
+def _prior_attempts(item: dict) -> int:
+    # Items arrive already claimed, so the stored count includes this attempt
+    return int(item.get("attempts") or 1) - 1
+
+
+async def _process_item_async(item: dict, results: list[dict]) -> None:
     item_id = str(item.get("id"))
     job_id = str(item.get("job_id"))
     idx = item.get("idx")
     canonical_key = item.get("canonical_key")
-    attempts = int(item.get("attempts") or 0)
-
-    if attempts >= MAX_ATTEMPTS:
-        _log(f"max attempts reached item_id={item_id} job_id={job_id} idx={idx}")
-        supabase_client.update_bulk_item_result(
-            item_id=item_id,
-            status="failed",
-            error="Max attempts exceeded",
-        )
-        return
+    attempts = _prior_attempts(item)
 
-    claimed = supabase_client.try_claim_bulk_item(item_id=item_id, attempts=attempts)
-    if not claimed:
-        _log(f"skipping item_id={item_id} (already claimed by another replica)")
-        return
-
-    job = supabase_client.get_bulk_job(job_id)
+    # The claim RPC attaches the job, license and quota to each item
+    job = item.get("job")
     if not job:
-        supabase_client.update_bulk_item_result(item_id=item_id, status="failed", error="Job not found")
+        await supabase_client.update_bulk_item_result_async(item_id=item_id, status="failed", error="Job not found")
         return
 
     if (job.get("status") or "").lower() in ("canceled", "failed"):
-        supabase_client.update_bulk_item_result(item_id=item_id, status="failed", error=f"Job status={job.get('status')}")
+        await supabase_client.update_bulk_item_result_async(item_id=item_id, status="failed", error=f"Job status={job.get('status')}")
         return
 
-    license_key = str(job.get("license_key") or "")
-    license_data = supabase_client.get_license_by_key(license_key)
+    license_data = item.get("license")
     if not license_data or license_data.get("status") != "active":
-        supabase_client.update_bulk_item_result(item_id=item_id, status="failed", error="License not active")
-        supabase_client.recompute_bulk_job_counters(job_id=job_id)
+        await supabase_client.update_bulk_item_result_async(item_id=item_id, status="failed", error="License not active")
         return
 
     api_key_id = str(license_data.get("id"))
     
     # Check if API key can generate more pages (dual-limit validation)
-    can_generate, reason, stats = supabase_client.check_can_generate(api_key_id)
+    can_generate, reason, stats = evaluate_generation_quota(item.get("quota"))
     if not can_generate:
-        _log(f"Cannot generate: {reason} - stats={stats}")
-        supabase_client.update_bulk_item_result(item_id=item_id, status="failed", error=reason)
-        supabase_client.recompute_bulk_job_counters(job_id=job_id)
+        logger.info("Cannot generate: %s - stats=%s", reason, stats)
+        await supabase_client.update_bulk_item_result_async(item_id=item_id, status="failed", error=reason)
         return
 
     try:
         # Extract all metadata fields from item
         page_mode = str(item.get("page_mode") or "service_city")
         
-        _log(f"DEBUG item data: page_mode={page_mode} email='{item.get('email')}' phone='{item.get('phone')}' company=name='{item.get('company_name')}'")
+        logger.debug("item data: page_mode=%s email='%s' phone='%s' company_name='%s'", page_mode, item.get("email"), item.get("phone"), item.get("company_name"))
         
-        # Build PageData with all fields needed for different page modes
-        data = PageData(
-            page_mode=page_mode,
-            service=str(item.get("service") or ""),
-            city=str(item.get("city") or ""),
-            state=str(item.get("state") or ""),
-            company_name=str(item.get("company_name") or ""),
-            phone=str(item.get("phone") or ""),
-            email=str(item.get("email") or ""),
-            address=str(item.get("address") or ""),
-            hub_key=str(item.get("hub_key") or ""),
-            hub_label=str(item.get("hub_label") or ""),
-            hub_slug=str(item.get("hub_slug") or ""),
-            city_slug=str(item.get("city_slug") or ""),
-            vertical=str(item.get("vertical") or ""),
-            business_name=str(item.get("business_name") or ""),
-            cta_text=str(item.get("cta_text") or "Request a Free Estimate"),
-            service_area_label=str(item.get("service_area_label") or ""),
-        )
+        # Build PageData with all fields needed for different page modes. Every value
+        # is already a str, so construct without re-running field validation.
+        fields = {k: str(item.get(k) or "") for k in _PAGE_DATA_STR_FIELDS}
+        fields["page_mode"] = page_mode
+        fields["cta_text"] = str(item.get("cta_text") or "Request a Free Estimate")
+        data = PageData.model_construct(**fields)
         
-        _log(f"DEBUG PageData created: page_mode={data.page_mode} hub_key={data.hub_key} email='{data.email}' phone='{data.phone}' company='{data.company_name}'")
+        logger.debug("PageData created: page_mode=%s hub_key=%s email='%s' phone='%s' company='%s'", data.page_mode, data.hub_key, data.email, data.phone, data.company_name)
 
-        _log(f"generating item_id={item_id} job_id={job_id} idx={idx} key={canonical_key}")
-        # Run CPU-intensive AI generation in thread pool to avoid blocking
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(executor, ai_generator.generate_page_content, data)
-        
-        # Save result_json immediately after successful generation
-        result_data = result.model_dump()
-        supabase_client.update_bulk_item_result(
-            item_id=item_id,
-            status="running",
-            result_json=result_data,
-        )
+        # The claim RPC attaches an earlier result for identical inputs under the
+        # same license, so re-run jobs don't pay for the OpenAI call again
+        result_data = item.get("reusable_result")
+        if result_data:
+            logger.info("reusing result item_id=%s job_id=%s idx=%s key=%s", item_id, job_id, idx, canonical_key)
+        else:
+            logger.info("generating item_id=%s job_id=%s idx=%s key=%s", item_id, job_id, idx, canonical_key)
+            # Run CPU-intensive AI generation in thread pool to avoid blocking
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(_EXECUTOR, ai_generator.generate_page_content, data)
+            result_data = result.model_dump()
 
-        # Log usage immediately after saving result - this ensures usage is tracked
-        # even if subsequent operations fail (important for accurate billing/limits)
-        usage_logged = supabase_client.log_usage(
+        # Queue the usage entry as soon as the page is generated, before the result
+        # write. The background writer inserts it shortly after and shutdown flushes
+        # the queue, but the write is best effort: a hard kill loses queued entries
+        # and quota checks may not count them for a moment.
+        supabase_client.log_usage(
             api_key_id=api_key_id,
             action="bulk_item_generation_success",
             details={
@@ -150,40 +223,35 @@ async def _process_item_async(item: dict, executor: ThreadPoolExecutor) -> None:
                 "service": data.service,
                 "city": data.city,
                 "state": data.state,
-                "title": result.title,
-                "slug": result.slug,
+                "title": result_data.get("title"),
+                "slug": result_data.get("slug"),
+                "reused": bool(item.get("reusable_result")),
             },
         )
-        
-        if not usage_logged:
-            _log(f"WARNING: Failed to log usage for item_id={item_id}")
 
-        # Mark as completed after all operations succeed
-        supabase_client.update_bulk_item_result(
-            item_id=item_id,
-            status="completed",
-        )
+        # Result and completed status are written with the rest of the batch
+        results.append({"id": item_id, "status": "completed", "result_json": result_data})
 
     except Exception as e:
-        _log(f"error generating item_id={item_id} job_id={job_id} idx={idx} attempts={attempts} err={e}")
+        logger.warning("error generating item_id=%s job_id=%s idx=%s attempts=%s err=%s", item_id, job_id, idx, attempts, e)
         # Retry logic: allow 1 retry (attempts 1 and 2), fail on attempt 2+
         if attempts < 2:
-            _log(f"retrying item_id={item_id} (attempt {attempts + 1})")
-            supabase_client.update_bulk_item_result(
+            logger.info("retrying item_id=%s (attempt %s)", item_id, attempts + 1)
+            await supabase_client.update_bulk_item_result_async(
                 item_id=item_id,
                 status="pending",
                 error=f"Retry {attempts + 1}: {str(e)}",
             )
         else:
-            _log(f"permanently failing item_id={item_id} after {attempts} attempts")
-            supabase_client.update_bulk_item_result(
+            logger.warning("permanently failing item_id=%s after %s attempts", item_id, attempts)
+            await supabase_client.update_bulk_item_result_async(
                 item_id=item_id,
                 status="failed",
                 error=str(e),
             )
         try:
             supabase_client.log_usage(
-                license_id=license_id,
+                api_key_id=api_key_id,
                 action="bulk_item_generation_failed",
                 details={
                     "job_id": job_id,
@@ -194,25 +262,74 @@ async def _process_item_async(item: dict, executor: ThreadPoolExecutor) -> None:
                     "attempts": attempts,
                 },
             )
+        except Exception as log_error:
+            logger.warning("log_usage failed item_id=%s err=%s", item_id, log_error)
+
+
+async def _consume_items(queue: asyncio.Queue, results: list[dict], in_flight: dict[str, dict], slot_free: asyncio.Event) -> None:
+    """Process claimed items from the queue until cancelled."""
+    while True:
+        item = await queue.get()
+        try:
+            await _process_item_async(item, results)
         except Exception:
-            pass
+            logger.exception("unhandled error item_id=%s", item.get("id"))
+        finally:
+            in_flight.pop(str(item.get("id")), None)
+            slot_free.set()
+            queue.task_done()
 
-    supabase_client.recompute_bulk_job_counters(job_id=job_id)
+
+async def _flush_writes(results: list[dict]) -> None:
+    """Write accumulated item results; the bulk_jobs counters follow via trigger."""
+    if not results:
+        return
+    # Take ownership of the pending writes before awaiting; consumers keep appending
+    pending_results = results[:]
+    results.clear()
+
+    if await supabase_client.update_bulk_item_results_async(pending_results):
+        logger.info("flushed %s results", len(pending_results))
+        return
+
+    logger.warning("batch result write failed, writing %s results individually", len(pending_results))
+    written = 0
+    for entry in pending_results:
+        ok = await supabase_client.update_bulk_item_result_async(
+            item_id=entry["id"],
+            status=entry["status"],
+            result_json=entry.get("result_json"),
+            error=entry.get("error"),
+            attempts=entry.get("attempts"),
+        )
+        if ok:
+            written += 1
+        else:
+            # Keep it for the next flush; the page is already generated and billed
+            results.append(entry)
+    logger.info("flushed %s results, %s left for retry", written, len(pending_results) - written)
+
+
+async def _flush_writes_periodically(results: list[dict]) -> None:
+    while True:
+        await asyncio.sleep(RESULT_FLUSH_SECONDS)
+        try:
+            await _flush_writes(results)
+        except Exception:
+            logger.exception("flush failed")
 
 
 async def main_async() -> None:
-    _log("worker started")
+    logger.info("worker started")
     
-    # Start health check server in background thread
-    health_thread = Thread(target=start_health_server, daemon=True)
-    health_thread.start()
+    health_server = await start_health_server()
     
-    _log(f"argv={sys.argv}")
-    _log(f"python={sys.version.splitlines()[0]}")
-    _log(f"pid={os.getpid()}")
-    _log(
-        "env="
-        + ",".join(
+    logger.info("argv=%s", sys.argv)
+    logger.info("python=%s", sys.version.splitlines()[0])
+    logger.info("pid=%s", os.getpid())
+    logger.info(
+        "env=%s",
+        ",".join(
             [
                 f"SUPABASE_URL={'set' if os.getenv('SUPABASE_URL') else 'missing'}",
                 f"SUPABASE_SECRET_KEY={'set' if os.getenv('SUPABASE_SECRET_KEY') else 'missing'}",
@@ -220,51 +337,100 @@ async def main_async() -> None:
             ]
         )
     )
-    try:
-        ps = subprocess.check_output(["ps", "aux"], text=True)
-        ps_lines = "\n".join(ps.splitlines()[:25])
-        _log("ps_aux_top=\n" + ps_lines)
-    except Exception as e:
-        _log(f"ps_aux_failed err={e}")
+    # Read from getrusage rather than forking `ps`; ru_maxrss is in KiB on Linux
+    logger.info("max_rss_kb=%s threads=%s", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, active_count())
 
     last_heartbeat = 0.0
-    # Create thread pool for CPU-intensive AI generation
-    executor = ThreadPoolExecutor(max_workers=CONCURRENT_WORKERS)
+
+    wake = asyncio.Event()
+    idle_wait = IDLE_WAIT_MIN_SECONDS
+
+    # Consumers process items continuously, so one slow item doesn't hold up
+    # claiming. Only as many items are claimed as there are free consumers:
+    # claimed rows carry a job/quota snapshot and are invisible to other
+    # replicas, so they shouldn't sit waiting locally.
+    queue: asyncio.Queue = asyncio.Queue()
+    results: list[dict] = []
+    in_flight: dict[str, dict] = {}
+    slot_free = asyncio.Event()
+    background = [
+        asyncio.create_task(_consume_items(queue, results, in_flight, slot_free))
+        for _ in range(CONCURRENT_WORKERS)
+    ]
+    background.append(asyncio.create_task(_flush_writes_periodically(results)))
+    background.append(asyncio.create_task(_listen_for_pending_items(wake)))
     
     try:
         while True:
             now = time.time()
             if now - last_heartbeat > 60:
-                _log("heartbeat")
+                logger.info("heartbeat")
                 last_heartbeat = now
 
-            # Add small random delay to reduce collision probability between replicas
-            await asyncio.sleep(random.uniform(0.1, 0.5))
-            
-            _log(f"polling limit={BATCH_LIMIT}")
-            items = supabase_client.list_pending_bulk_items(limit=BATCH_LIMIT)
-            _log(f"found {len(items)} pending items")
+            slot_free.clear()
+            limit = min(BATCH_LIMIT, CONCURRENT_WORKERS - len(in_flight))
+            if limit <= 0:
+                await slot_free.wait()
+                continue
+
+            # Cleared before claiming so rows that turn pending mid-batch still wake us
+            wake.clear()
+            logger.debug("polling limit=%s", limit)
+            items = await supabase_client.claim_bulk_items_async(limit=limit)
+            logger.debug("claimed %s pending items", len(items))
             if not items:
-                await asyncio.sleep(random.randint(IDLE_SLEEP_SECONDS[0], IDLE_SLEEP_SECONDS[1]))
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=idle_wait)
+                    idle_wait = IDLE_WAIT_MIN_SECONDS
+                except asyncio.TimeoutError:
+                    idle_wait = min(idle_wait * IDLE_WAIT_BACKOFF, IDLE_WAIT_MAX_SECONDS)
                 continue
+            idle_wait = IDLE_WAIT_MIN_SECONDS
 
-            _log(f"processing {len(items)} items in parallel (max {CONCURRENT_WORKERS} concurrent)")
-            # Process items concurrently
-            tasks = []
             for item in items:
-                _log(f"queuing item_id={item.get('id')} job_id={item.get('job_id')} idx={item.get('idx')}")
-                task = asyncio.create_task(_process_item_async(item, executor))
-                tasks.append(task)
-            
-            # Wait for all tasks to complete
-            await asyncio.gather(*tasks, return_exceptions=True)
-            _log(f"completed batch of {len(items)} items")
+                if _prior_attempts(item) >= MAX_ATTEMPTS:
+                    # Exhausted items skip the consumers and fail with the next flush
+                    logger.warning("max attempts reached item_id=%s job_id=%s idx=%s", item.get("id"), item.get("job_id"), item.get("idx"))
+                    results.append({"id": str(item.get("id")), "status": "failed", "error": "Max attempts exceeded"})
+                    continue
+                logger.debug("queuing item_id=%s job_id=%s idx=%s", item.get("id"), item.get("job_id"), item.get("idx"))
+                in_flight[str(item.get("id"))] = item
+                queue.put_nowait(item)
     finally:
-        executor.shutdown(wait=True)
+        health_server.close()
+        # Snapshot before cancelling: cancelled consumers drop their item from in_flight
+        unfinished = list(in_flight.values())
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        # Queued or interrupted items go back to 'pending' for the next claim,
+        # without counting the attempt that was cut short
+        for item in unfinished:
+            results.append({"id": str(item.get("id")), "status": "pending", "attempts": _prior_attempts(item)})
+        if unfinished:
+            logger.info("returning %s unfinished items to pending", len(unfinished))
+        await _flush_writes(results)
+        if results:
+            logger.error("exiting with %s unwritten results: %s", len(results), [entry["id"] for entry in results])
+        supabase_client.flush_usage_logs()
+        await supabase_client.aclose()
+
+
+async def _run_until_terminated() -> None:
+    # Railway stops containers with SIGTERM, which asyncio.run doesn't handle.
+    # Cancelling the main task runs main_async's finally, which writes out
+    # results still waiting for a flush.
+    main_task = asyncio.create_task(main_async())
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+    try:
+        await main_task
+    except asyncio.CancelledError:
+        logger.info("worker stopped")
 
 
 def main() -> None:
-    asyncio.run(main_async())
+    configure_logging(f"%(asctime)s %(levelname)s [SEOgen Worker][Replica:{REPLICA_ID}] %(name)s: %(message)s")
+    asyncio.run(_run_until_terminated())
 
 
 if __name__ == "__main__":